@@ -6,15 +6,79 @@ import discord
 import aiohttp
 from datetime import datetime
 import sqlite3
-from typing import Dict, List, Optional
+from typing import Dict, List, Mapping, Optional, Tuple
 from meshtastic import mesh_pb2, portnums_pb2
 import time
 import concurrent.futures
+from collections import OrderedDict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Formatted node names kept in memory; busy meshes can see many transient nodes
+NODE_NAME_CACHE_SIZE = 1000
+
+# Recently processed (message_id, source) keys kept in memory ahead of SQLite
+RECENT_MESSAGE_CACHE_SIZE = 10000
+
+# Discord rejects messages over 2000 characters; long ones are split with some headroom
+DISCORD_MESSAGE_LIMIT = 2000
+DISCORD_CHUNK_SIZE = 1900
+
+def parse_radios(env: Mapping[str, str]) -> List[Dict[str, str]]:
+    """Parse radio configuration from an environment mapping"""
+    radios = []
+    
+    # Try JSON format first
+    radio_configs = env.get('RADIOS')
+    if radio_configs:
+        try:
+            radios = json.loads(radio_configs)
+        except json.JSONDecodeError:
+            logger.error("Invalid RADIOS JSON format")
+            
+    # Fallback to single radio
+    if not radios:
+        radio = {
+            "name": env.get('RADIO_NAME', 'Radio'),
+            "host": env.get('MESHTASTIC_HOST', 'meshtastic.local'),
+            "port": env.get('MESHTASTIC_PORT', '80')
+        }
+        # Add display name if configured
+        display_name = env.get('RADIO_DISPLAY_NAME')
+        if display_name:
+            radio["display_name"] = display_name
+        radios = [radio]
+        
+    logger.info(f"Configured radios: {[r.get('display_name', r['name']) for r in radios]}")
+    return radios
+
+def parse_message_filters(env: Mapping[str, str]) -> Dict[str, bool]:
+    """Parse message filtering configuration from an environment mapping"""
+    defaults = {
+        'text_messages': True,
+        'position_updates': True,
+        'node_info': True,
+        'telemetry': True,
+        'routing': False,
+        'admin': True,
+        'detection_sensor': True,
+        'range_test': True,
+        'store_forward': True,
+        'unknown': False
+    }
+    
+    filters = {}
+    for msg_type, default in defaults.items():
+        env_key = f"SHOW_{msg_type.upper()}"
+        env_value = env.get(env_key, str(default)).lower()
+        filters[msg_type] = env_value in ['true', '1', 'yes', 'on']
+        
+    enabled = [k for k, v in filters.items() if v]
+    logger.info(f"Enabled message types: {enabled}")
+    return filters
+
 class MeshtasticDiscordBot:
     def __init__(self):
         # Basic config validation
@@ -39,6 +103,19 @@ class MeshtasticDiscordBot:
         # Signal strength reporting
         self.show_signal_strength = os.getenv('SHOW_SIGNAL_STRENGTH', 'true').lower() in ['true', '1', 'yes', 'on']
         
+        # Database location (':memory:' keeps it in memory only)
+        self.db_path = os.getenv('MESHCORD_DB_PATH', 'data/message_tracking.db')
+        
+        # Formatted name lookups, invalidated when the underlying row is written.
+        # Node names are capped at NODE_NAME_CACHE_SIZE, least recently used first;
+        # radio info is keyed by configured radio names, so it stays small.
+        self._node_name_cache: OrderedDict = OrderedDict()
+        self._radio_info_cache: Dict[str, str] = {}
+        
+        # Most recently processed (message_id, source) keys, bounded by
+        # RECENT_MESSAGE_CACHE_SIZE and cleared whenever old messages are purged
+        self._recent_messages: OrderedDict = OrderedDict()
+        
         # Discord client setup
         intents = discord.Intents.default()
         intents.message_content = True
@@ -72,61 +149,18 @@ class MeshtasticDiscordBot:
         
     def _parse_radios(self) -> List[Dict[str, str]]:
         """Parse radio configuration from environment variables"""
-        radios = []
-        
-        # Try JSON format first
-        radio_configs = os.getenv('RADIOS')
-        if radio_configs:
-            try:
-                radios = json.loads(radio_configs)
-            except json.JSONDecodeError:
-                logger.error("Invalid RADIOS JSON format")
-                
-        # Fallback to single radio
-        if not radios:
-            radio = {
-                "name": os.getenv('RADIO_NAME', 'Radio'),
-                "host": os.getenv('MESHTASTIC_HOST', 'meshtastic.local'),
-                "port": os.getenv('MESHTASTIC_PORT', '80')
-            }
-            # Add display name if configured
-            display_name = os.getenv('RADIO_DISPLAY_NAME')
-            if display_name:
-                radio["display_name"] = display_name
-            radios = [radio]
-            
-        logger.info(f"Configured radios: {[r.get('display_name', r['name']) for r in radios]}")
-        return radios
+        return parse_radios(os.environ)
         
     def _parse_message_filters(self) -> Dict[str, bool]:
         """Parse message filtering configuration"""
-        defaults = {
-            'text_messages': True,
-            'position_updates': True,
-            'node_info': True,
-            'telemetry': True,
-            'routing': False,
-            'admin': True,
-            'detection_sensor': True,
-            'range_test': True,
-            'store_forward': True,
-            'unknown': False
-        }
-        
-        filters = {}
-        for msg_type, default in defaults.items():
-            env_key = f"SHOW_{msg_type.upper()}"
-            env_value = os.getenv(env_key, str(default)).lower()
-            filters[msg_type] = env_value in ['true', '1', 'yes', 'on']
-            
-        enabled = [k for k, v in filters.items() if v]
-        logger.info(f"Enabled message types: {enabled}")
-        return filters
+        return parse_message_filters(os.environ)
         
     def _init_database(self):
         """Initialize SQLite database for message tracking, node info, and radio info"""
-        os.makedirs('data', exist_ok=True)
-        self.conn = sqlite3.connect('data/message_tracking.db')
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
         cursor = self.conn.cursor()
         
         # Message tracking table
@@ -137,7 +171,7 @@ class MeshtasticDiscordBot:
                 timestamp INTEGER,
                 processed_at INTEGER,
                 PRIMARY KEY (message_id, source)
-            )
+            ) WITHOUT ROWID
         ''')
         
         # Node database table
@@ -161,12 +195,21 @@ class MeshtasticDiscordBot:
             )
         ''')
         
+        self.conn.commit()
+        
         # Clean up old messages (24+ hours)
+        self._cleanup_old_messages()
+        
+    def _cleanup_old_messages(self, max_age: int = 86400):
+        """Delete processed message records older than max_age seconds"""
+        cursor = self.conn.cursor()
         cursor.execute(
             'DELETE FROM processed_messages WHERE processed_at < ?',
-            (int(datetime.now().timestamp()) - 86400,)
+            (int(time.time()) - max_age,)
         )
         self.conn.commit()
+        # Deleted keys must not keep answering from the in-memory cache
+        self._recent_messages.clear()
         
     def _setup_discord_events(self):
         """Setup Discord event handlers"""
@@ -197,12 +240,26 @@ class MeshtasticDiscordBot:
     # DATABASE METHODS
     def _is_message_processed(self, message_id: str, source: str) -> bool:
         """Check if message has been processed"""
+        key = (message_id, source)
+        if key in self._recent_messages:
+            return True
+        
         cursor = self.conn.cursor()
         cursor.execute(
             'SELECT 1 FROM processed_messages WHERE message_id = ? AND source = ?',
             (message_id, source)
         )
-        return cursor.fetchone() is not None
+        if cursor.fetchone() is None:
+            return False
+        self._remember_message(key)
+        return True
+        
+    def _remember_message(self, key: Tuple[str, str]):
+        """Record a processed message key, evicting the oldest past the cache size"""
+        self._recent_messages[key] = None
+        self._recent_messages.move_to_end(key)
+        if len(self._recent_messages) > RECENT_MESSAGE_CACHE_SIZE:
+            self._recent_messages.popitem(last=False)
         
     def _mark_message_processed(self, message_id: str, source: str, timestamp: int):
         """Mark message as processed"""
@@ -211,10 +268,22 @@ class MeshtasticDiscordBot:
             INSERT OR REPLACE INTO processed_messages 
             (message_id, source, timestamp, processed_at) 
             VALUES (?, ?, ?, ?)
-        ''', (message_id, source, timestamp, int(datetime.now().timestamp())))
+        ''', (message_id, source, timestamp, int(time.time())))
         self.conn.commit()
+        self._remember_message((message_id, source))
         
     def _get_node_name(self, node_id: int) -> str:
+        """Get node name from cache or database, fallback to ID"""
+        name = self._node_name_cache.get(node_id)
+        if name is None:
+            name = self._node_name_cache[node_id] = self._lookup_node_name(node_id)
+            if len(self._node_name_cache) > NODE_NAME_CACHE_SIZE:
+                self._node_name_cache.popitem(last=False)
+        else:
+            self._node_name_cache.move_to_end(node_id)
+        return name
+        
+    def _lookup_node_name(self, node_id: int) -> str:
         """Get node name from database, fallback to ID"""
         cursor = self.conn.cursor()
         cursor.execute(
@@ -243,8 +312,9 @@ class MeshtasticDiscordBot:
                     INSERT OR REPLACE INTO nodes 
                     (node_id, short_name, long_name, last_seen) 
                     VALUES (?, ?, ?, ?)
-                ''', (node_id, short_name, long_name, int(datetime.now().timestamp())))
+                ''', (node_id, short_name, long_name, int(time.time())))
                 self.conn.commit()
+                self._node_name_cache.pop(node_id, None)
                 
                 display_name = short_name or long_name
                 logger.info(f"Updated node info: {display_name} ({node_id:08x})")
@@ -253,6 +323,13 @@ class MeshtasticDiscordBot:
             logger.error(f"Error updating node info: {e}")
             
     def _get_radio_info(self, source: str) -> str:
+        """Get radio identification info from cache or database"""
+        info = self._radio_info_cache.get(source)
+        if info is None:
+            info = self._radio_info_cache[source] = self._lookup_radio_info(source)
+        return info
+        
+    def _lookup_radio_info(self, source: str) -> str:
         """Get radio identification info from database"""
         cursor = self.conn.cursor()
         cursor.execute(
@@ -295,8 +372,9 @@ class MeshtasticDiscordBot:
                     INSERT OR REPLACE INTO radios 
                     (source_name, node_id, short_name, long_name, last_updated) 
                     VALUES (?, ?, ?, ?, ?)
-                ''', (source, node_id, display_name, '', int(datetime.now().timestamp())))
+                ''', (source, node_id, display_name, '', int(time.time())))
                 self.conn.commit()
+                self._radio_info_cache.pop(source, None)
                 
                 logger.info(f"Updated radio info for {display_name}: node {node_id:08x}")
                 
@@ -556,18 +634,21 @@ class MeshtasticDiscordBot:
     async def _process_from_radio(self, from_radio, source: str):
         """Process a FromRadio protobuf message"""
         try:
-            if from_radio.HasField('packet'):
+            # Single oneof lookup instead of probing each field with HasField
+            variant = from_radio.WhichOneof('payload_variant')
+
+            if variant == 'packet':
                 await self._process_mesh_packet(from_radio.packet, source)
-            elif from_radio.HasField('node_info'):
+            elif variant == 'node_info':
                 node_info = from_radio.node_info
                 if hasattr(node_info, 'num') and hasattr(node_info, 'user'):
                     self._update_node_info(node_info.num, node_info.user)
-            elif from_radio.HasField('my_info'):
+            elif variant == 'my_info':
                 my_info = from_radio.my_info
                 self._update_radio_info(source, my_info)
                 if self.debug_mode:
                     logger.debug(f"Received radio info from {source}")
-            elif from_radio.HasField('config'):
+            elif variant == 'config':
                 if self.debug_mode:
                     logger.debug(f"Received config from {source}")
                     
@@ -754,10 +835,10 @@ class MeshtasticDiscordBot:
             channel = self.client.get_channel(self.channel_id)
             if channel:
                 # Handle Discord's 2000 character limit
-                if len(message) > 2000:
-                    chunks = [message[i:i+1900] for i in range(0, len(message), 1900)]
-                    for chunk in chunks:
-                        await channel.send(chunk)
+                if len(message) > DISCORD_MESSAGE_LIMIT:
+                    # Slice each chunk as it is sent rather than building the whole list up front
+                    for i in range(0, len(message), DISCORD_CHUNK_SIZE):
+                        await channel.send(message[i:i+DISCORD_CHUNK_SIZE])
                 else:
                     await channel.send(message)
             else:
@@ -0,0 +1,65 @@
+"""Shared fixtures for the test suite"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from meshcord_bot import MeshtasticDiscordBot
+
+
+TEST_ENV = {
+    'DISCORD_BOT_TOKEN': 'test_token_123',
+    'DISCORD_CHANNEL_ID': '123456789',
+    'CONNECTION_METHOD': 'serial',
+    'SERIAL_PORT': '/dev/ttyUSB0',
+    'MESHCORD_DB_PATH': ':memory:'
+}
+
+
+@pytest.fixture
+def test_env(monkeypatch):
+    """Fixture providing minimal valid environment"""
+    for key, value in TEST_ENV.items():
+        monkeypatch.setenv(key, value)
+    return monkeypatch
+
+
+@pytest.fixture(scope='session', autouse=True)
+def mock_discord_client():
+    """Fixture patching the Discord client once for the whole session"""
+    # Patching in the class itself gives every bot its own fresh client mock
+    with patch('meshcord_bot.discord.Client', new=MagicMock):
+        yield
+
+
+@pytest.fixture
+def bot(test_env):
+    """Fixture providing initialized bot instance"""
+    bot = MeshtasticDiscordBot()
+    yield bot
+    if bot.conn:
+        bot.conn.close()
+
+
+@pytest.fixture
+def make_bot(test_env):
+    """Fixture building bots from the current environment and closing them afterwards"""
+    bots = []
+
+    def _make_bot():
+        bot = MeshtasticDiscordBot()
+        bots.append(bot)
+        return bot
+
+    yield _make_bot
+    for bot in bots:
+        bot.conn.close()
+
+
+@pytest.fixture(scope='session')
+def shared_bot():
+    """Fixture providing one bot shared by read-only tests across the session"""
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in TEST_ENV.items():
+            mp.setenv(key, value)
+        bot = MeshtasticDiscordBot()
+    yield bot
+    bot.conn.close()
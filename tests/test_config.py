@@ -2,251 +2,212 @@
 import pytest
 import os
 import json
-import tempfile
-import shutil
-from unittest.mock import patch, Mock
-
-
-@pytest.fixture
-def clean_env():
-    """Fixture to clean up environment variables after tests"""
-    original_env = dict(os.environ)
-    yield
-    # Restore original environment
-    os.environ.clear()
-    os.environ.update(original_env)
-
-
-@pytest.fixture
-def test_env(clean_env):
-    """Fixture providing minimal valid environment"""
-    os.environ.update({
-        'DISCORD_BOT_TOKEN': 'test_token_123',
-        'DISCORD_CHANNEL_ID': '123456789',
-        'CONNECTION_METHOD': 'serial',
-        'SERIAL_PORT': '/dev/ttyUSB0'
-    })
-    return os.environ
-
-
-@pytest.fixture
-def temp_dir():
-    """Fixture providing temporary directory"""
-    tmpdir = tempfile.mkdtemp()
-    original_cwd = os.getcwd()
-    os.chdir(tmpdir)
-    yield tmpdir
-    os.chdir(original_cwd)
-    shutil.rmtree(tmpdir, ignore_errors=True)
+
+from meshcord_bot import MeshtasticDiscordBot, parse_message_filters, parse_radios
+
+
+_RADIOS_JSON = json.dumps([
+    {"name": "radio1", "host": "host1.local", "port": "80", "display_name": "Radio 1"},
+    {"name": "radio2", "host": "host2.local", "port": "8080"}
+])
 
 
 @pytest.mark.unit
 class TestConfigurationValidation:
     """Test configuration validation"""
 
-    def test_missing_discord_token(self, clean_env, temp_dir):
-        """Should raise error when DISCORD_BOT_TOKEN is missing"""
-        os.environ['DISCORD_CHANNEL_ID'] = '123456'
-
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            with pytest.raises(ValueError, match="DISCORD_BOT_TOKEN is required"):
-                MeshtasticDiscordBot()
-
-    def test_missing_channel_id(self, clean_env, temp_dir):
-        """Should raise error when DISCORD_CHANNEL_ID is missing"""
-        os.environ['DISCORD_BOT_TOKEN'] = 'test_token'
-
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            with pytest.raises(ValueError, match="DISCORD_CHANNEL_ID is required"):
-                MeshtasticDiscordBot()
-
-    def test_invalid_channel_id(self, clean_env, temp_dir):
-        """Should raise error when DISCORD_CHANNEL_ID is not a valid integer"""
-        os.environ.update({
-            'DISCORD_BOT_TOKEN': 'test_token',
-            'DISCORD_CHANNEL_ID': 'not_a_number'
-        })
-
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            with pytest.raises(ValueError, match="DISCORD_CHANNEL_ID must be a valid integer"):
-                MeshtasticDiscordBot()
-
-    def test_valid_configuration(self, test_env, temp_dir):
+    @pytest.mark.parametrize('env,message', [
+        pytest.param({'DISCORD_CHANNEL_ID': '123456'},
+                     "DISCORD_BOT_TOKEN is required", id='missing_token'),
+        pytest.param({'DISCORD_BOT_TOKEN': 'test_token'},
+                     "DISCORD_CHANNEL_ID is required", id='missing_channel_id'),
+        pytest.param({'DISCORD_BOT_TOKEN': 'test_token', 'DISCORD_CHANNEL_ID': 'not_a_number'},
+                     "DISCORD_CHANNEL_ID must be a valid integer", id='invalid_channel_id'),
+    ])
+    def test_invalid_configuration(self, monkeypatch, env, message):
+        """Should raise a descriptive error for missing or invalid Discord settings"""
+        for key in ('DISCORD_BOT_TOKEN', 'DISCORD_CHANNEL_ID'):
+            monkeypatch.delenv(key, raising=False)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+
+        with pytest.raises(ValueError, match=message):
+            MeshtasticDiscordBot()
+
+    def test_valid_configuration(self, test_env, make_bot):
         """Should initialize successfully with valid configuration"""
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        bot = make_bot()
 
-            assert bot.discord_token == 'test_token_123'
-            assert bot.channel_id == 123456789
-            assert bot.connection_method == 'serial'
+        assert bot.discord_token == 'test_token_123'
+        assert bot.channel_id == 123456789
+        assert bot.connection_method == 'serial'
 
 
 @pytest.mark.unit
 class TestRadioConfiguration:
     """Test radio configuration parsing"""
 
-    def test_single_radio_fallback(self, test_env, temp_dir):
+    def test_single_radio_fallback(self):
         """Should create single radio from environment variables"""
-        os.environ.update({
+        radios = parse_radios({
             'MESHTASTIC_HOST': 'radio1.local',
             'MESHTASTIC_PORT': '8080',
             'RADIO_NAME': 'TestRadio'
         })
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        assert len(radios) == 1
+        assert radios[0]['name'] == 'TestRadio'
+        assert radios[0]['host'] == 'radio1.local'
+        assert radios[0]['port'] == '8080'
 
-            assert len(bot.radios) == 1
-            assert bot.radios[0]['name'] == 'TestRadio'
-            assert bot.radios[0]['host'] == 'radio1.local'
-            assert bot.radios[0]['port'] == '8080'
-
-    def test_single_radio_with_display_name(self, test_env, temp_dir):
+    def test_single_radio_with_display_name(self):
         """Should include display name if configured"""
-        os.environ.update({
+        radios = parse_radios({
             'MESHTASTIC_HOST': 'radio1.local',
             'RADIO_NAME': 'radio1',
             'RADIO_DISPLAY_NAME': 'My Radio'
         })
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-
-            assert bot.radios[0]['display_name'] == 'My Radio'
+        assert radios[0]['display_name'] == 'My Radio'
 
-    def test_multiple_radios_json(self, test_env, temp_dir):
+    def test_multiple_radios_json(self):
         """Should parse multiple radios from JSON"""
-        radios_json = json.dumps([
-            {"name": "radio1", "host": "host1.local", "port": "80", "display_name": "Radio 1"},
-            {"name": "radio2", "host": "host2.local", "port": "8080"}
-        ])
-        os.environ['RADIOS'] = radios_json
-
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-
-            assert len(bot.radios) == 2
-            assert bot.radios[0]['name'] == 'radio1'
-            assert bot.radios[0]['display_name'] == 'Radio 1'
-            assert bot.radios[1]['name'] == 'radio2'
-            assert bot.radios[1]['host'] == 'host2.local'
-
-    def test_invalid_radios_json_fallback(self, test_env, temp_dir):
+        radios = parse_radios({'RADIOS': _RADIOS_JSON})
+
+        assert len(radios) == 2
+        assert radios[0]['name'] == 'radio1'
+        assert radios[0]['display_name'] == 'Radio 1'
+        assert radios[1]['name'] == 'radio2'
+        assert radios[1]['host'] == 'host2.local'
+
+    def test_invalid_radios_json_fallback(self):
         """Should fallback to single radio on invalid JSON"""
-        os.environ['RADIOS'] = '{invalid json'
-        os.environ['RADIO_NAME'] = 'FallbackRadio'
+        radios = parse_radios({'RADIOS': '{invalid json', 'RADIO_NAME': 'FallbackRadio'})
+
+        # Should fall back to single radio
+        assert len(radios) == 1
+        assert radios[0]['name'] == 'FallbackRadio'
+
+    def test_bot_reads_radios_from_environment(self, test_env, make_bot):
+        """Should parse radios from the process environment on startup"""
+        test_env.setenv('RADIOS', _RADIOS_JSON)
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        bot = make_bot()
 
-            # Should fall back to single radio
-            assert len(bot.radios) == 1
-            assert bot.radios[0]['name'] == 'FallbackRadio'
+        assert [radio['name'] for radio in bot.radios] == ['radio1', 'radio2']
 
 
 @pytest.mark.unit
 class TestMessageFilters:
     """Test message filtering configuration"""
 
-    def test_default_filters(self, test_env, temp_dir):
+    def test_default_filters(self):
         """Should use correct defaults for message filters"""
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-
-            # Check defaults
-            assert bot.message_filters['text_messages'] is True
-            assert bot.message_filters['position_updates'] is True
-            assert bot.message_filters['node_info'] is True
-            assert bot.message_filters['telemetry'] is True
-            assert bot.message_filters['routing'] is False
-            assert bot.message_filters['admin'] is True
-            assert bot.message_filters['unknown'] is False
-
-    def test_custom_filters(self, test_env, temp_dir):
+        filters = parse_message_filters({})
+
+        # Check defaults
+        assert filters['text_messages'] is True
+        assert filters['position_updates'] is True
+        assert filters['node_info'] is True
+        assert filters['telemetry'] is True
+        assert filters['routing'] is False
+        assert filters['admin'] is True
+        assert filters['unknown'] is False
+
+    @pytest.mark.parametrize('env_key,value,filter_name,expected', [
+        ('SHOW_TEXT_MESSAGES', 'false', 'text_messages', False),
+        ('SHOW_ROUTING', 'true', 'routing', True),
+        ('SHOW_POSITION_UPDATES', '0', 'position_updates', False),
+        ('SHOW_TELEMETRY', '1', 'telemetry', True),
+    ])
+    def test_custom_filters(self, env_key, value, filter_name, expected):
         """Should parse custom filter settings from environment"""
-        os.environ.update({
-            'SHOW_TEXT_MESSAGES': 'false',
-            'SHOW_ROUTING': 'true',
-            'SHOW_POSITION_UPDATES': '0',
-            'SHOW_TELEMETRY': '1'
-        })
+        filters = parse_message_filters({env_key: value})
+
+        assert filters[filter_name] is expected
+
+    def test_bot_reads_filters_from_environment(self, test_env, make_bot):
+        """Should parse message filters from the process environment on startup"""
+        test_env.setenv('SHOW_ROUTING', 'true')
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        bot = make_bot()
 
-            assert bot.message_filters['text_messages'] is False
-            assert bot.message_filters['routing'] is True
-            assert bot.message_filters['position_updates'] is False
-            assert bot.message_filters['telemetry'] is True
+        assert bot.message_filters['routing'] is True
 
 
 @pytest.mark.unit
 class TestOtherConfiguration:
     """Test other configuration options"""
 
-    def test_serial_timeout_default(self, test_env, temp_dir):
+    def test_serial_timeout_default(self, test_env, make_bot):
         """Should use default serial timeout"""
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        bot = make_bot()
 
-            assert bot.serial_timeout == 240  # 4 minutes default
+        assert bot.serial_timeout == 240  # 4 minutes default
 
-    def test_serial_timeout_custom(self, test_env, temp_dir):
+    def test_serial_timeout_custom(self, test_env, make_bot):
         """Should parse custom serial timeout"""
-        os.environ['SERIAL_TIMEOUT'] = '300'
+        test_env.setenv('SERIAL_TIMEOUT', '300')
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
+        bot = make_bot()
 
-            assert bot.serial_timeout == 300
+        assert bot.serial_timeout == 300
 
-    def test_signal_strength_display(self, test_env, temp_dir):
+    @pytest.mark.parametrize('value,expected', [
+        (None, True),
+        ('false', False),
+        ('yes', True),
+        ('0', False),
+    ])
+    def test_signal_strength_display(self, test_env, make_bot, value, expected):
         """Should parse signal strength display setting"""
-        # Test default (true)
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-            assert bot.show_signal_strength is True
-
-        # Test explicit false
-        os.environ['SHOW_SIGNAL_STRENGTH'] = 'false'
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-            assert bot.show_signal_strength is False
-
-    def test_debug_mode(self, test_env, temp_dir):
+        if value is None:
+            test_env.delenv('SHOW_SIGNAL_STRENGTH', raising=False)
+        else:
+            test_env.setenv('SHOW_SIGNAL_STRENGTH', value)
+
+        bot = make_bot()
+
+        assert bot.show_signal_strength is expected
+
+    @pytest.mark.parametrize('value,expected', [
+        (None, False),
+        ('true', True),
+        ('True', True),
+        ('false', False),
+    ])
+    def test_debug_mode(self, test_env, make_bot, value, expected):
         """Should parse debug mode setting"""
-        # Test default (false)
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-            assert bot.debug_mode is False
-
-        # Test enabled
-        os.environ['DEBUG_MODE'] = 'true'
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-            assert bot.debug_mode is True
-
-    def test_connection_method_default(self, test_env, temp_dir):
+        if value is None:
+            test_env.delenv('DEBUG_MODE', raising=False)
+        else:
+            test_env.setenv('DEBUG_MODE', value)
+
+        bot = make_bot()
+
+        assert bot.debug_mode is expected
+
+    def test_connection_method_default(self, test_env, make_bot):
         """Should default to http connection method"""
-        os.environ.pop('CONNECTION_METHOD', None)
+        test_env.delenv('CONNECTION_METHOD', raising=False)
+
+        bot = make_bot()
+        assert bot.connection_method == 'http'
+
+    def test_db_path_default(self, test_env, make_bot, tmp_path):
+        """Should store the database under data/ by default"""
+        test_env.delenv('MESHCORD_DB_PATH', raising=False)
+        test_env.chdir(tmp_path)
+
+        bot = make_bot()
+
+        assert bot.db_path == 'data/message_tracking.db'
+        assert os.path.exists('data/message_tracking.db')
+
+    def test_db_path_in_memory(self, test_env, make_bot, tmp_path):
+        """Should use an in-memory database without touching disk"""
+        test_env.chdir(tmp_path)
+        bot = make_bot()
 
-        with patch('meshcord_bot.discord.Client'):
-            from meshcord_bot import MeshtasticDiscordBot
-            bot = MeshtasticDiscordBot()
-            assert bot.connection_method == 'http'
+        assert bot.db_path == ':memory:'
+        assert not os.path.exists('data')
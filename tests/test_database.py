@@ -1,55 +1,40 @@
 """Tests for database operations"""
 import pytest
-import os
-import tempfile
-import shutil
 import sqlite3
-from datetime import datetime
-from unittest.mock import patch, Mock
+import time
+from types import SimpleNamespace
 
 
-@pytest.fixture
-def clean_env():
-    """Fixture to clean up environment variables after tests"""
-    original_env = dict(os.environ)
-    yield
-    os.environ.clear()
-    os.environ.update(original_env)
+# Fixed packet timestamp so tracking tests never depend on the wall clock
+FIXED_TS = 1_700_000_000
 
 
-@pytest.fixture
-def test_env(clean_env):
-    """Fixture providing minimal valid environment"""
-    os.environ.update({
-        'DISCORD_BOT_TOKEN': 'test_token_123',
-        'DISCORD_CHANNEL_ID': '123456789',
-        'CONNECTION_METHOD': 'serial',
-        'SERIAL_PORT': '/dev/ttyUSB0'
-    })
-    return os.environ
+def _user(short_name, long_name):
+    """Build a lightweight stand-in for a mesh_pb2.User"""
+    return SimpleNamespace(short_name=short_name, long_name=long_name)
 
 
-@pytest.fixture
-def temp_dir():
-    """Fixture providing temporary directory"""
-    tmpdir = tempfile.mkdtemp()
-    original_cwd = os.getcwd()
-    os.chdir(tmpdir)
-    yield tmpdir
-    os.chdir(original_cwd)
-    shutil.rmtree(tmpdir, ignore_errors=True)
+@pytest.fixture(scope='session')
+def schema_columns(shared_bot):
+    """Fixture mapping each table to its column names, introspected once"""
+    cursor = shared_bot.conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = [row[0] for row in cursor.fetchall()]
+
+    columns = {}
+    for table in tables:
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns[table] = {row[1] for row in cursor.fetchall()}
+    return columns
 
 
 @pytest.fixture
-def bot(test_env, temp_dir):
-    """Fixture providing initialized bot instance"""
-    with patch('meshcord_bot.discord.Client'):
-        from meshcord_bot import MeshtasticDiscordBot
-        bot = MeshtasticDiscordBot()
-        yield bot
-        # Cleanup
-        if bot.conn:
-            bot.conn.close()
+def statements(bot):
+    """Fixture recording every statement the bot's connection runs"""
+    executed = []
+    bot.conn.set_trace_callback(executed.append)
+    yield executed
+    bot.conn.set_trace_callback(None)
 
 
 @pytest.mark.unit
@@ -57,53 +42,59 @@ class TestDatabaseInitialization:
     """Test database initialization"""
 
     def test_database_created(self, bot):
-        """Should create database file and tables"""
-        import os
-        assert os.path.exists('data/message_tracking.db')
-
+        """Should create database tables"""
+        expected_tables = {'processed_messages', 'nodes', 'radios'}
         cursor = bot.conn.cursor()
 
-        # Check tables exist
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        # Check all tables exist in a single query
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN (?, ?, ?)",
+            tuple(expected_tables)
+        )
         tables = {row[0] for row in cursor.fetchall()}
 
-        assert 'processed_messages' in tables
-        assert 'nodes' in tables
-        assert 'radios' in tables
+        assert tables == expected_tables
 
-    def test_processed_messages_table_schema(self, bot):
-        """Should have correct schema for processed_messages table"""
-        cursor = bot.conn.cursor()
-        cursor.execute("PRAGMA table_info(processed_messages)")
-        columns = {row[1]: row[2] for row in cursor.fetchall()}
+    def test_processed_messages_lookup_indexed(self, shared_bot):
+        """Should have a unique index covering (message_id, source)"""
+        cursor = shared_bot.conn.cursor()
+        cursor.execute("PRAGMA index_list(processed_messages)")
+        unique_indexes = [row[1] for row in cursor.fetchall() if row[2]]
 
-        assert 'message_id' in columns
-        assert 'source' in columns
-        assert 'timestamp' in columns
-        assert 'processed_at' in columns
+        indexed_columns = set()
+        for index_name in unique_indexes:
+            cursor.execute(f"PRAGMA index_info({index_name})")
+            indexed_columns.add(tuple(row[2] for row in cursor.fetchall()))
 
-    def test_nodes_table_schema(self, bot):
-        """Should have correct schema for nodes table"""
-        cursor = bot.conn.cursor()
-        cursor.execute("PRAGMA table_info(nodes)")
-        columns = {row[1]: row[2] for row in cursor.fetchall()}
+        assert ('message_id', 'source') in indexed_columns
 
-        assert 'node_id' in columns
-        assert 'short_name' in columns
-        assert 'long_name' in columns
-        assert 'last_seen' in columns
+    def test_processed_messages_without_rowid(self, shared_bot):
+        """Should store processed_messages clustered on its primary key"""
+        cursor = shared_bot.conn.cursor()
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'processed_messages'")
 
-    def test_radios_table_schema(self, bot):
-        """Should have correct schema for radios table"""
-        cursor = bot.conn.cursor()
-        cursor.execute("PRAGMA table_info(radios)")
-        columns = {row[1]: row[2] for row in cursor.fetchall()}
+        assert 'WITHOUT ROWID' in cursor.fetchone()[0]
+
+    def test_processed_lookup_uses_index(self, shared_bot):
+        """Should answer the duplicate check with an index search, not a scan"""
+        cursor = shared_bot.conn.cursor()
+        cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT 1 FROM processed_messages WHERE message_id = ? AND source = ?",
+            ('msg', 'radio1')
+        )
+        plan = ' '.join(row[-1] for row in cursor.fetchall())
+
+        assert plan.startswith('SEARCH')
+        assert 'message_id=? AND source=?' in plan
 
-        assert 'source_name' in columns
-        assert 'node_id' in columns
-        assert 'short_name' in columns
-        assert 'long_name' in columns
-        assert 'last_updated' in columns
+    @pytest.mark.parametrize('table,expected_columns', [
+        ('processed_messages', {'message_id', 'source', 'timestamp', 'processed_at'}),
+        ('nodes', {'node_id', 'short_name', 'long_name', 'last_seen'}),
+        ('radios', {'source_name', 'node_id', 'short_name', 'long_name', 'last_updated'}),
+    ])
+    def test_table_schema(self, schema_columns, table, expected_columns):
+        """Should have correct columns for each table"""
+        assert expected_columns <= schema_columns[table]
 
 
 @pytest.mark.unit
@@ -119,7 +110,7 @@ class TestMessageTracking:
         """Should mark message as processed"""
         message_id = 'test_msg_456'
         source = 'radio1'
-        timestamp = int(datetime.now().timestamp())
+        timestamp = FIXED_TS
 
         bot._mark_message_processed(message_id, source, timestamp)
 
@@ -129,7 +120,7 @@ class TestMessageTracking:
     def test_different_sources_tracked_separately(self, bot):
         """Same message ID from different sources should be tracked separately"""
         message_id = 'test_msg_789'
-        timestamp = int(datetime.now().timestamp())
+        timestamp = FIXED_TS
 
         bot._mark_message_processed(message_id, 'radio1', timestamp)
 
@@ -149,7 +140,7 @@ class TestMessageTracking:
         """Message tracking data should be persisted in database"""
         message_id = 'test_persist_123'
         source = 'radio1'
-        timestamp = 1234567890
+        timestamp = FIXED_TS
 
         bot._mark_message_processed(message_id, source, timestamp)
 
@@ -166,6 +157,77 @@ class TestMessageTracking:
         assert result[1] == source
         assert result[2] == timestamp
 
+    def test_cleanup_removes_only_old_messages(self, bot):
+        """Should delete records older than the cutoff and keep recent ones"""
+        now = int(time.time())
+        bot.conn.executemany(
+            'INSERT INTO processed_messages (message_id, source, timestamp, processed_at) VALUES (?, ?, ?, ?)',
+            [('old_msg', 'radio1', 0, now - 90000), ('new_msg', 'radio1', 0, now)]
+        )
+        bot.conn.commit()
+
+        bot._cleanup_old_messages()
+
+        assert bot._is_message_processed('old_msg', 'radio1') is False
+        assert bot._is_message_processed('new_msg', 'radio1') is True
+
+    def test_recent_message_cache_bounded(self, bot, monkeypatch):
+        """Should evict the oldest keys but still find them in the database"""
+        monkeypatch.setattr('meshcord_bot.RECENT_MESSAGE_CACHE_SIZE', 2)
+
+        for i in range(3):
+            bot._mark_message_processed(f'msg_{i}', 'radio1', FIXED_TS)
+
+        assert list(bot._recent_messages) == [('msg_1', 'radio1'), ('msg_2', 'radio1')]
+        assert bot._is_message_processed('msg_0', 'radio1') is True
+
+    def test_processed_lookup_is_per_source(self, bot):
+        """Should find seeded rows only under the source they were stored for"""
+        bot.conn.executemany(
+            'INSERT INTO processed_messages (message_id, source, timestamp, processed_at) VALUES (?, ?, ?, ?)',
+            [(f'bulk_{i}', f'radio{i % 2}', FIXED_TS + i, FIXED_TS) for i in range(1000)]
+        )
+        bot.conn.commit()
+
+        assert bot._is_message_processed('bulk_999', 'radio1') is True
+        assert bot._is_message_processed('bulk_999', 'radio0') is False
+
+
+@pytest.mark.unit
+class TestQueryCounts:
+    """Guard hot paths against extra per-packet queries"""
+
+    @staticmethod
+    def _data_statements(executed):
+        return [sql for sql in executed if sql.split()[0].upper() not in ('BEGIN', 'COMMIT')]
+
+    def test_duplicate_check_single_query(self, bot, statements):
+        """Should check for a processed message with one query"""
+        bot._is_message_processed('msg_1', 'radio1')
+
+        assert len(self._data_statements(statements)) == 1
+
+    def test_mark_processed_single_query(self, bot, statements):
+        """Should mark a message processed with one write and no lookup first"""
+        bot._mark_message_processed('msg_1', 'radio1', FIXED_TS)
+
+        assert len(self._data_statements(statements)) == 1
+
+    def test_recently_marked_message_skips_database(self, bot, statements):
+        """Should answer the duplicate check for a just-marked message from memory"""
+        bot._mark_message_processed('msg_1', 'radio1', FIXED_TS)
+        statements.clear()
+
+        assert bot._is_message_processed('msg_1', 'radio1') is True
+        assert self._data_statements(statements) == []
+
+    def test_cached_node_name_skips_database(self, bot, statements):
+        """Should only query the database on the first node name lookup"""
+        bot._get_node_name(0x12345678)
+        bot._get_node_name(0x12345678)
+
+        assert len(self._data_statements(statements)) == 1
+
 
 @pytest.mark.unit
 class TestNodeDatabase:
@@ -182,10 +244,8 @@ class TestNodeDatabase:
         """Should store and retrieve node information"""
         node_id = 0xABCDEF01
 
-        # Create mock user info
-        user_info = Mock()
-        user_info.short_name = 'TST1'
-        user_info.long_name = 'Test Node 1'
+        # Create user info
+        user_info = _user('TST1', 'Test Node 1')
 
         bot._update_node_info(node_id, user_info)
 
@@ -199,9 +259,7 @@ class TestNodeDatabase:
         """Should prefer short name over long name"""
         node_id = 0x11223344
 
-        user_info = Mock()
-        user_info.short_name = 'SHT'
-        user_info.long_name = 'Very Long Name Here'
+        user_info = _user('SHT', 'Very Long Name Here')
 
         bot._update_node_info(node_id, user_info)
 
@@ -210,13 +268,34 @@ class TestNodeDatabase:
         assert 'SHT' in name
         assert 'Very Long Name Here' not in name
 
+    def test_node_name_cache_refreshed_on_update(self, bot):
+        """Should not serve a stale cached name after the node is updated"""
+        node_id = 0x0BADF00D
+        assert bot._get_node_name(node_id) == '0badf00d'
+
+        user_info = _user('NEW', '')
+
+        bot._update_node_info(node_id, user_info)
+
+        assert bot._get_node_name(node_id) == 'NEW (0badf00d)'
+
+    def test_node_name_cache_bounded(self, bot, monkeypatch):
+        """Should evict the least recently used node names past the cache size"""
+        monkeypatch.setattr('meshcord_bot.NODE_NAME_CACHE_SIZE', 2)
+
+        bot._get_node_name(1)
+        bot._get_node_name(2)
+        bot._get_node_name(1)
+        bot._get_node_name(3)
+
+        assert list(bot._node_name_cache) == [1, 3]
+        assert bot._get_node_name(2) == '00000002'
+
     def test_node_long_name_when_no_short_name(self, bot):
         """Should use long name when short name is empty"""
         node_id = 0x55667788
 
-        user_info = Mock()
-        user_info.short_name = ''
-        user_info.long_name = 'LongName'
+        user_info = _user('', 'LongName')
 
         bot._update_node_info(node_id, user_info)
 
@@ -228,13 +307,11 @@ class TestNodeDatabase:
         """Should update last_seen timestamp"""
         node_id = 0x99887766
 
-        user_info = Mock()
-        user_info.short_name = 'TST'
-        user_info.long_name = 'Test'
+        user_info = _user('TST', 'Test')
 
-        before_time = int(datetime.now().timestamp())
+        before_time = int(time.time())
         bot._update_node_info(node_id, user_info)
-        after_time = int(datetime.now().timestamp())
+        after_time = int(time.time())
 
         # Query database
         cursor = bot.conn.cursor()
@@ -255,6 +332,16 @@ class TestRadioDatabase:
         info = bot._get_radio_info('unknown_radio')
         assert 'unknown_radio' in info
 
+    def test_radio_info_cache_refreshed_on_update(self, bot):
+        """Should not serve stale cached radio info after the radio is updated"""
+        assert bot._get_radio_info('late_radio') == 'late_radio'
+
+        my_info = SimpleNamespace(my_node_num=0x0000BEEF)
+
+        bot._update_radio_info('late_radio', my_info)
+
+        assert bot._get_radio_info('late_radio') == 'late_radio (0000beef)'
+
     def test_update_and_retrieve_radio_info(self, bot):
         """Should store and retrieve radio information"""
         source = 'test_radio'
@@ -268,9 +355,8 @@ class TestRadioDatabase:
             'display_name': 'Test Radio'
         })
 
-        # Create mock my_info
-        my_info = Mock()
-        my_info.my_node_num = node_id
+        # Create my_info
+        my_info = SimpleNamespace(my_node_num=node_id)
 
         bot._update_radio_info(source, my_info)
 
@@ -291,8 +377,7 @@ class TestRadioDatabase:
             'display_name': 'My Custom Radio'
         })
 
-        my_info = Mock()
-        my_info.my_node_num = 0x12345678
+        my_info = SimpleNamespace(my_node_num=0x12345678)
 
         bot._update_radio_info(source, my_info)
 
@@ -305,23 +390,23 @@ class TestRadioDatabase:
 class TestMessageFiltering:
     """Test message type filtering"""
 
-    def test_should_process_enabled_types(self, bot):
+    def test_should_process_enabled_types(self, shared_bot, monkeypatch):
         """Should process message types that are enabled"""
-        bot.message_filters['text_messages'] = True
-        bot.message_filters['telemetry'] = True
+        monkeypatch.setitem(shared_bot.message_filters, 'text_messages', True)
+        monkeypatch.setitem(shared_bot.message_filters, 'telemetry', True)
 
-        assert bot._should_process_message_type('text_messages') is True
-        assert bot._should_process_message_type('telemetry') is True
+        assert shared_bot._should_process_message_type('text_messages') is True
+        assert shared_bot._should_process_message_type('telemetry') is True
 
-    def test_should_not_process_disabled_types(self, bot):
+    def test_should_not_process_disabled_types(self, shared_bot, monkeypatch):
         """Should not process message types that are disabled"""
-        bot.message_filters['routing'] = False
-        bot.message_filters['unknown'] = False
+        monkeypatch.setitem(shared_bot.message_filters, 'routing', False)
+        monkeypatch.setitem(shared_bot.message_filters, 'unknown', False)
 
-        assert bot._should_process_message_type('routing') is False
-        assert bot._should_process_message_type('unknown') is False
+        assert shared_bot._should_process_message_type('routing') is False
+        assert shared_bot._should_process_message_type('unknown') is False
 
-    def test_should_handle_unknown_types(self, bot):
+    def test_should_handle_unknown_types(self, shared_bot):
         """Should return False for unknown message types"""
-        result = bot._should_process_message_type('nonexistent_type')
+        result = shared_bot._should_process_message_type('nonexistent_type')
         assert result is False
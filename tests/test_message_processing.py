@@ -1,53 +1,71 @@
 """Tests for message processing logic"""
+import asyncio
+import math
 import pytest
-import os
-import tempfile
-import shutil
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 from unittest.mock import patch, Mock, AsyncMock
 from meshtastic import mesh_pb2, portnums_pb2
 
+from meshcord_bot import DISCORD_CHUNK_SIZE
 
-@pytest.fixture
-def clean_env():
-    """Fixture to clean up environment variables after tests"""
-    original_env = dict(os.environ)
-    yield
-    os.environ.clear()
-    os.environ.update(original_env)
 
+# Read-only decoded text payload shared by the message info tests
+TEXT_DECODED = SimpleNamespace(portnum=portnums_pb2.TEXT_MESSAGE_APP, payload=b'Test')
 
-@pytest.fixture
-def test_env(clean_env):
-    """Fixture providing minimal valid environment"""
-    os.environ.update({
-        'DISCORD_BOT_TOKEN': 'test_token_123',
-        'DISCORD_CHANNEL_ID': '123456789',
-        'CONNECTION_METHOD': 'serial',
-        'SERIAL_PORT': '/dev/ttyUSB0'
+# Message over Discord's 2000 character limit
+LONG_MESSAGE = "A" * 2500
+
+
+def make_packet(*, id, from_, rx_time, decoded=None, rx_snr=0.0, rx_rssi=0):
+    """Build a mesh packet; 'from' is a keyword, so it is passed as from_"""
+    return SimpleNamespace(**{
+        'id': id,
+        'from': from_,
+        'rx_time': rx_time,
+        'rx_snr': rx_snr,
+        'rx_rssi': rx_rssi,
+        'decoded': decoded,
     })
-    return os.environ
 
 
-@pytest.fixture
-def temp_dir():
-    """Fixture providing temporary directory"""
-    tmpdir = tempfile.mkdtemp()
-    original_cwd = os.getcwd()
-    os.chdir(tmpdir)
-    yield tmpdir
-    os.chdir(original_cwd)
-    shutil.rmtree(tmpdir, ignore_errors=True)
+class StubChannel:
+    """Minimal Discord channel that records sent messages"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+class FakeResponse:
+    """Canned aiohttp response usable as an async context manager"""
+
+    def __init__(self, status, body=b''):
+        self.status = status
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    """Minimal aiohttp session that records requested URLs"""
 
+    def __init__(self, response):
+        self.response = response
+        self.requested = []
 
-@pytest.fixture
-def bot(test_env, temp_dir):
-    """Fixture providing initialized bot instance"""
-    with patch('meshcord_bot.discord.Client'):
-        from meshcord_bot import MeshtasticDiscordBot
-        bot = MeshtasticDiscordBot()
-        yield bot
-        if bot.conn:
-            bot.conn.close()
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return self.response
 
 
 @pytest.mark.unit
@@ -56,9 +74,7 @@ class TestMessageInfoExtraction:
 
     def test_text_message_extraction(self, bot):
         """Should extract text message content"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Hello World'
+        decoded = SimpleNamespace(portnum=portnums_pb2.TEXT_MESSAGE_APP, payload=b'Hello World')
 
         from_id = 0x12345678
         rx_time = 1234567890
@@ -71,145 +87,66 @@ class TestMessageInfoExtraction:
         assert 'Hello World' in message_info['content']
         assert '12345678' in message_info['content']
 
-    def test_position_update_message(self, bot):
-        """Should identify position update messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.POSITION_APP
-        decoded.payload = b''
+    @pytest.mark.parametrize('portnum,expected_type,expected_text', [
+        (portnums_pb2.POSITION_APP, 'position_updates', 'Position update'),
+        (portnums_pb2.NODEINFO_APP, 'node_info', 'Node info'),
+        (portnums_pb2.TELEMETRY_APP, 'telemetry', 'Telemetry'),
+        (portnums_pb2.ROUTING_APP, 'routing', 'Routing'),
+        (portnums_pb2.ADMIN_APP, 'admin', 'Admin'),
+        (portnums_pb2.DETECTION_SENSOR_APP, 'detection_sensor', 'Detection sensor'),
+        (portnums_pb2.RANGE_TEST_APP, 'range_test', 'Range test'),
+        (portnums_pb2.STORE_FORWARD_APP, 'store_forward', 'Store & Forward'),
+        (9999, 'unknown', 'Unknown message (port 9999)'),  # Unknown port number
+    ])
+    def test_message_type_extraction(self, bot, portnum, expected_type, expected_text):
+        """Should identify each message type by port number"""
+        decoded = SimpleNamespace(portnum=portnum, payload=b'')
 
         message_info = bot._get_message_info(decoded, 0x11111111, 1234567890, 'radio1', '3.5', '-85')
 
         assert message_info is not None
-        assert message_info['type'] == 'position_updates'
-        assert 'Position update' in message_info['content']
+        assert message_info['type'] == expected_type
+        assert expected_text in message_info['content']
 
-    def test_node_info_message(self, bot):
-        """Should identify node info messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.NODEINFO_APP
-        decoded.payload = b''
-
-        message_info = bot._get_message_info(decoded, 0x22222222, 1234567890, 'radio1', '4.0', '-75')
-
-        assert message_info is not None
-        assert message_info['type'] == 'node_info'
-        assert 'Node info' in message_info['content']
-
-    def test_telemetry_message(self, bot):
-        """Should identify telemetry messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TELEMETRY_APP
-        decoded.payload = b''
-
-        message_info = bot._get_message_info(decoded, 0x33333333, 1234567890, 'radio1', '6.0', '-70')
-
-        assert message_info is not None
-        assert message_info['type'] == 'telemetry'
-        assert 'Telemetry' in message_info['content']
-
-    def test_routing_message(self, bot):
-        """Should identify routing messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.ROUTING_APP
-        decoded.payload = b''
-
-        message_info = bot._get_message_info(decoded, 0x44444444, 1234567890, 'radio1', '2.5', '-90')
-
-        assert message_info is not None
-        assert message_info['type'] == 'routing'
-        assert 'Routing' in message_info['content']
-
-    def test_admin_message(self, bot):
-        """Should identify admin messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.ADMIN_APP
-        decoded.payload = b''
-
-        message_info = bot._get_message_info(decoded, 0x55555555, 1234567890, 'radio1', '5.5', '-72')
-
-        assert message_info is not None
-        assert message_info['type'] == 'admin'
-        assert 'Admin' in message_info['content']
-
-    def test_unknown_message_type(self, bot):
-        """Should handle unknown message types"""
-        decoded = Mock()
-        decoded.portnum = 9999  # Unknown port number
-        decoded.payload = b''
-
-        message_info = bot._get_message_info(decoded, 0x66666666, 1234567890, 'radio1', '4.2', '-78')
-
-        assert message_info is not None
-        assert message_info['type'] == 'unknown'
-        assert 'Unknown message' in message_info['content']
-        assert '9999' in message_info['content']
-
-    def test_signal_strength_included_when_enabled(self, bot):
+    def test_signal_strength_included_when_enabled(self, bot, monkeypatch):
         """Should include signal strength when enabled"""
-        bot.show_signal_strength = True
+        monkeypatch.setattr(bot, 'show_signal_strength', True)
 
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Test'
-
-        message_info = bot._get_message_info(decoded, 0x77777777, 1234567890, 'radio1', '7.5', '-65')
+        message_info = bot._get_message_info(TEXT_DECODED, 0x77777777, 1234567890, 'radio1', '7.5', '-65')
 
         assert 'SNR: 7.5' in message_info['content']
         assert 'RSSI: -65' in message_info['content']
 
-    def test_signal_strength_excluded_when_disabled(self, bot):
+    def test_signal_strength_excluded_when_disabled(self, bot, monkeypatch):
         """Should exclude signal strength when disabled"""
-        bot.show_signal_strength = False
-
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Test'
+        monkeypatch.setattr(bot, 'show_signal_strength', False)
 
-        message_info = bot._get_message_info(decoded, 0x88888888, 1234567890, 'radio1', '5.0', '-80')
+        message_info = bot._get_message_info(TEXT_DECODED, 0x88888888, 1234567890, 'radio1', '5.0', '-80')
 
         assert 'SNR' not in message_info['content']
         assert 'RSSI' not in message_info['content']
 
-    def test_empty_text_message_returns_none(self, bot):
-        """Should return None for empty text messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b''
+    @pytest.mark.parametrize('payload', [b'', b'   \n\t  '], ids=['empty', 'whitespace'])
+    def test_blank_text_message_returns_none(self, bot, payload):
+        """Should return None for empty or whitespace-only text messages"""
+        decoded = SimpleNamespace(portnum=portnums_pb2.TEXT_MESSAGE_APP, payload=payload)
 
         message_info = bot._get_message_info(decoded, 0x99999999, 1234567890, 'radio1', '5.0', '-80')
 
         assert message_info is None
 
-    def test_whitespace_only_text_message_returns_none(self, bot):
-        """Should return None for whitespace-only text messages"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'   \n\t  '
-
-        message_info = bot._get_message_info(decoded, 0xAAAAAAAA, 1234567890, 'radio1', '5.0', '-80')
-
-        assert message_info is None
-
     def test_discord_timestamp_format(self, bot):
         """Should format timestamps in Discord format"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Test'
-
         rx_time = 1234567890
 
-        message_info = bot._get_message_info(decoded, 0xBBBBBBBB, rx_time, 'radio1', '5.0', '-80')
+        message_info = bot._get_message_info(TEXT_DECODED, 0xBBBBBBBB, rx_time, 'radio1', '5.0', '-80')
 
         # Discord timestamp format
         assert '<t:1234567890:t>' in message_info['content']
 
     def test_no_timestamp_shows_na(self, bot):
         """Should show N/A when timestamp is not available"""
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Test'
-
-        message_info = bot._get_message_info(decoded, 0xCCCCCCCC, 0, 'radio1', '5.0', '-80')
+        message_info = bot._get_message_info(TEXT_DECODED, 0xCCCCCCCC, 0, 'radio1', '5.0', '-80')
 
         assert 'N/A' in message_info['content']
 
@@ -221,37 +158,33 @@ class TestDiscordMessageSending:
     @pytest.mark.asyncio
     async def test_send_normal_message(self, bot):
         """Should send normal messages directly"""
-        mock_channel = AsyncMock()
-        bot.client.get_channel = Mock(return_value=mock_channel)
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
         message = "Test message"
         await bot._send_to_discord(message)
 
-        mock_channel.send.assert_called_once_with(message)
+        assert channel.sent == [message]
 
     @pytest.mark.asyncio
     async def test_send_long_message_chunks(self, bot):
         """Should chunk messages over 2000 characters"""
-        mock_channel = AsyncMock()
-        bot.client.get_channel = Mock(return_value=mock_channel)
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
-        # Create message over 2000 chars
-        long_message = "A" * 2500
+        await bot._send_to_discord(LONG_MESSAGE)
 
-        await bot._send_to_discord(long_message)
+        # Should be sent in exactly ceil(len / chunk size) chunks within the safe limit
+        assert len(channel.sent) == math.ceil(len(LONG_MESSAGE) / DISCORD_CHUNK_SIZE)
+        assert all(len(chunk) <= DISCORD_CHUNK_SIZE for chunk in channel.sent)
 
-        # Should be called multiple times
-        assert mock_channel.send.call_count > 1
-
-        # Verify chunks don't exceed safe limit (1900)
-        for call in mock_channel.send.call_args_list:
-            chunk = call[0][0]
-            assert len(chunk) <= 1900
+        # Chunks should reassemble into the original message
+        assert ''.join(channel.sent) == LONG_MESSAGE
 
     @pytest.mark.asyncio
     async def test_channel_not_found_error(self, bot, caplog):
         """Should log error when channel not found"""
-        bot.client.get_channel = Mock(return_value=None)
+        bot.client.get_channel = lambda _id: None
 
         await bot._send_to_discord("Test message")
 
@@ -267,22 +200,14 @@ class TestPacketProcessing:
     @pytest.mark.asyncio
     async def test_duplicate_message_filtered(self, bot):
         """Should filter duplicate messages"""
-        # Create mock packet
-        packet = Mock()
-        packet.id = 123
-        setattr(packet, 'from', 0x11111111)
-        packet.rx_time = 1234567890
-        packet.rx_snr = 5.0
-        packet.rx_rssi = -80
-
-        # Create decoded data
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.TEXT_MESSAGE_APP
-        decoded.payload = b'Test message'
-        packet.decoded = decoded
-
-        # Mock Discord sending
-        bot.client.get_channel = Mock(return_value=AsyncMock())
+        # Create packet
+        decoded = SimpleNamespace(portnum=portnums_pb2.TEXT_MESSAGE_APP, payload=b'Test message')
+        packet = make_packet(id=123, from_=0x11111111, rx_time=1234567890,
+                             decoded=decoded, rx_snr=5.0, rx_rssi=-80)
+
+        # Stub Discord sending
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
         # Process once
         await bot._process_mesh_packet(packet, 'radio1')
@@ -291,55 +216,40 @@ class TestPacketProcessing:
         assert bot._is_message_processed('11111111_123', 'radio1')
 
         # Process again
-        mock_channel = AsyncMock()
-        bot.client.get_channel = Mock(return_value=mock_channel)
-
         await bot._process_mesh_packet(packet, 'radio1')
 
         # Should not send again
-        mock_channel.send.assert_not_called()
+        assert len(channel.sent) == 1
 
     @pytest.mark.asyncio
     async def test_packet_without_decoded_ignored(self, bot):
         """Should ignore packets without decoded data"""
-        packet = Mock()
-        packet.id = 456
-        setattr(packet, 'from', 0x22222222)
-        packet.rx_time = 1234567890
-        packet.decoded = None
+        packet = make_packet(id=456, from_=0x22222222, rx_time=1234567890)
 
-        mock_channel = AsyncMock()
-        bot.client.get_channel = Mock(return_value=mock_channel)
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
         await bot._process_mesh_packet(packet, 'radio1')
 
         # Should not send anything
-        mock_channel.send.assert_not_called()
+        assert channel.sent == []
 
     @pytest.mark.asyncio
-    async def test_filtered_message_type_not_sent(self, bot):
+    async def test_filtered_message_type_not_sent(self, bot, monkeypatch):
         """Should not send messages of filtered types"""
-        bot.message_filters['routing'] = False
+        monkeypatch.setitem(bot.message_filters, 'routing', False)
 
-        packet = Mock()
-        packet.id = 789
-        setattr(packet, 'from', 0x33333333)
-        packet.rx_time = 1234567890
-        packet.rx_snr = 4.0
-        packet.rx_rssi = -85
+        decoded = SimpleNamespace(portnum=portnums_pb2.ROUTING_APP, payload=b'')
+        packet = make_packet(id=789, from_=0x33333333, rx_time=1234567890,
+                             decoded=decoded, rx_snr=4.0, rx_rssi=-85)
 
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.ROUTING_APP
-        decoded.payload = b''
-        packet.decoded = decoded
-
-        mock_channel = AsyncMock()
-        bot.client.get_channel = Mock(return_value=mock_channel)
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
         await bot._process_mesh_packet(packet, 'radio1')
 
         # Should not send
-        mock_channel.send.assert_not_called()
+        assert channel.sent == []
 
         # But should still mark as processed
         assert bot._is_message_processed('33333333_789', 'radio1')
@@ -352,28 +262,160 @@ class TestNodeInfoExtraction:
     @pytest.mark.asyncio
     async def test_node_info_updates_database(self, bot):
         """Should update node database from NODEINFO_APP packets"""
-        packet = Mock()
-        packet.id = 999
-        setattr(packet, 'from', 0x44444444)
-        packet.rx_time = 1234567890
-        packet.rx_snr = 5.0
-        packet.rx_rssi = -75
-
         # Create user info protobuf
         user_info = mesh_pb2.User()
         user_info.short_name = 'TST'
         user_info.long_name = 'Test Node'
 
-        decoded = Mock()
-        decoded.portnum = portnums_pb2.NODEINFO_APP
-        decoded.payload = user_info.SerializeToString()
-        packet.decoded = decoded
+        decoded = SimpleNamespace(portnum=portnums_pb2.NODEINFO_APP, payload=user_info.SerializeToString())
+        packet = make_packet(id=999, from_=0x44444444, rx_time=1234567890,
+                             decoded=decoded, rx_snr=5.0, rx_rssi=-75)
 
-        # Mock Discord sending
-        bot.client.get_channel = Mock(return_value=AsyncMock())
+        # Stub Discord sending
+        channel = StubChannel()
+        bot.client.get_channel = lambda _id: channel
 
         await bot._process_mesh_packet(packet, 'radio1')
 
         # Check node was updated
         node_name = bot._get_node_name(0x44444444)
         assert 'TST' in node_name
+
+
+@pytest.mark.unit
+class TestFromRadioProcessing:
+    """Test FromRadio payload dispatch"""
+
+    @pytest.mark.asyncio
+    async def test_my_info_updates_radio(self, bot):
+        """Should store radio node ID from my_info payloads"""
+        from_radio = mesh_pb2.FromRadio()
+        from_radio.my_info.my_node_num = 0x12ABCDEF
+
+        await bot._process_from_radio(from_radio, 'radio1')
+
+        assert '12abcdef' in bot._get_radio_info('radio1')
+
+    @pytest.mark.asyncio
+    async def test_node_info_updates_node(self, bot):
+        """Should store node names from node_info payloads"""
+        from_radio = mesh_pb2.FromRadio()
+        from_radio.node_info.num = 0x55555555
+        from_radio.node_info.user.short_name = 'NDE'
+
+        await bot._process_from_radio(from_radio, 'radio1')
+
+        assert 'NDE' in bot._get_node_name(0x55555555)
+
+
+@pytest.mark.unit
+class TestPacketCallback:
+    """Test serial packet callback"""
+
+    def test_callback_records_packet_time(self, bot):
+        """Should record the arrival time of the last packet"""
+        frozen_time = datetime(2024, 1, 1, 12, 0, 0)
+
+        with patch('meshcord_bot.datetime') as mock_datetime:
+            mock_datetime.now.return_value = frozen_time
+            bot._packet_callback(object(), None)
+
+        assert bot.last_packet_time == frozen_time
+
+    def test_callback_schedules_packet_on_loop(self, bot):
+        """Should hand the packet to the event loop thread-safely"""
+        bot.loop = Mock()
+
+        bot._packet_callback(object(), None)
+
+        bot.loop.call_soon_threadsafe.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_callbacks_from_threads_queue_every_packet(self, bot):
+        """Should queue every packet handed over from serial reader threads"""
+        bot.loop = asyncio.get_running_loop()
+        packets = [object() for _ in range(50)]
+
+        await asyncio.gather(*(
+            asyncio.to_thread(bot._packet_callback, packet, None) for packet in packets
+        ))
+
+        async def queue_filled():
+            while bot.packet_queue.qsize() < len(packets):
+                await asyncio.sleep(0)
+
+        await asyncio.wait_for(queue_filled(), timeout=1)
+
+        queued = [bot.packet_queue.get_nowait() for _ in range(bot.packet_queue.qsize())]
+        assert {id(packet) for _, packet in queued} == {id(packet) for packet in packets}
+        assert all(source == 'serial' for source, _ in queued)
+
+
+@pytest.mark.unit
+class TestSerialMonitoring:
+    """Test serial connection timeout handling"""
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_packet_timeout(self, bot):
+        """Should close and recreate the interface once packets stop arriving"""
+        interface = Mock()
+        bot._create_serial_interface = AsyncMock(
+            side_effect=[interface, asyncio.CancelledError()]
+        )
+        start = datetime(2024, 1, 1, 12, 0, 0)
+
+        # Sleeps return immediately and the clock jumps past the timeout
+        with patch('meshcord_bot.asyncio.sleep', new=AsyncMock()), \
+                patch('meshcord_bot.datetime') as mock_datetime:
+            mock_datetime.now.side_effect = [
+                start, start + timedelta(seconds=bot.serial_timeout + 1)
+            ]
+            with pytest.raises(asyncio.CancelledError):
+                await bot._monitor_serial()
+
+        interface.close.assert_called_once()
+        assert bot._create_serial_interface.await_count == 2
+        assert bot.meshtastic_interface is None
+
+
+@pytest.mark.unit
+class TestHttpPolling:
+    """Test HTTP radio polling"""
+
+    RADIO = {'name': 'radio1', 'host': 'radio.local', 'port': '80'}
+
+    @pytest.mark.asyncio
+    async def test_poll_processes_returned_data(self, bot):
+        """Should hand a 200 response body to the protobuf parser"""
+        bot.session = FakeSession(FakeResponse(200, b'\x01\x02'))
+        bot._process_protobuf_data = AsyncMock()
+
+        await bot._poll_radio_http(self.RADIO)
+
+        assert bot.session.requested == ['http://radio.local:80/api/v1/fromradio']
+        bot._process_protobuf_data.assert_awaited_once_with(b'\x01\x02', 'radio1')
+
+    @pytest.mark.asyncio
+    async def test_poll_ignores_no_data_response(self, bot):
+        """Should treat a 503 response as no pending messages"""
+        bot.session = FakeSession(FakeResponse(503))
+        bot._process_protobuf_data = AsyncMock()
+
+        await bot._poll_radio_http(self.RADIO)
+
+        bot._process_protobuf_data.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_monitor_polls_every_radio_each_cycle(self, bot):
+        """Should poll each radio once per cycle and then wait the poll interval"""
+        bot.radios = [self.RADIO, {'name': 'radio2', 'host': 'radio2.local', 'port': '80'}]
+        bot._poll_radio_http = AsyncMock()
+
+        # Second sleep ends the otherwise endless loop
+        sleep = AsyncMock(side_effect=[None, asyncio.CancelledError()])
+        with patch('meshcord_bot.asyncio.sleep', new=sleep):
+            with pytest.raises(asyncio.CancelledError):
+                await bot._monitor_radios_http()
+
+        assert bot._poll_radio_http.await_count == 4
+        sleep.assert_awaited_with(bot.poll_interval)